@@ -7,6 +7,7 @@ from typing import List, Dict
 import google.generativeai as genai
 from dotenv import load_dotenv
 from system_instructions import *
+from result_validation import validate_results, flagged_files, validation_summary
 import logging
 # import psycopg2
 
@@ -141,7 +142,7 @@ def process_single_document(file_path: str) -> Dict:
 #             cursor.close()
 #             connection.close()
 
-def batch_process(root_folder: str) -> Dict:
+def batch_process(root_folder: str, validate: bool = True) -> Dict:
     """Process all PDFs in directory tree using parallel processing"""
     results = {}
     
@@ -171,6 +172,22 @@ def batch_process(root_folder: str) -> Dict:
             # if result['status'] == 'success' and result['response']:
             #     executor.submit(insert_invoice_data, result['response'])
 
+        # Validate the whole batch at once and re-extract only flagged documents.
+        # A validation failure must never cost us the extraction results.
+        if validate:
+            try:
+                retry_files = flagged_files(validate_results(results))
+                if retry_files:
+                    logger.info(f"Re-extracting {len(retry_files)} flagged documents")
+                    for file_path, result in zip(retry_files, executor.map(process_single_document, retry_files)):
+                        if result['status'] == 'success':
+                            results[file_path] = result
+
+                for file_path, details in validation_summary(validate_results(results)).items():
+                    results[file_path]['validation'] = details
+            except Exception as e:
+                logger.error(f"Result validation failed: {str(e)}")
+
     # Save results
     output_file = f"batch_index_results_{int(time.time())}.json"
     with open(output_file, 'w') as f:
@@ -185,6 +202,8 @@ def batch_process(root_folder: str) -> Dict:
 def main():
     parser = argparse.ArgumentParser(description="Parallel Document Indexer using Gemini API")
     parser.add_argument("root_folder", help="Root directory containing PDF documents")
+    parser.add_argument("--no-validate", action="store_true",
+                        help="Skip result validation and cross-document consistency checks")
     # parser.add_argument("--workers", type=int,
     #                    help="Maximum parallel workers (default: 5)")
     args = parser.parse_args()
@@ -193,7 +212,7 @@ def main():
         logger.error(f"Invalid directory: {args.root_folder}")
         return
 
-    results = batch_process(args.root_folder)
+    results = batch_process(args.root_folder, validate=not args.no_validate)
     
     # Print summary
     success = sum(1 for r in results.values() if r['status'] == 'success')
@@ -202,6 +221,9 @@ def main():
     print(f"Total PDFs: {len(results)}")
     print(f"Successful: {success}")
     print(f"Errors: {errors}")
+    flagged = sum(1 for r in results.values() if r.get('validation', {}).get('flagged'))
+    if flagged:
+        print(f"Flagged after validation: {flagged}")
 
 if __name__ == "__main__":
     main() 
@@ -0,0 +1,139 @@
+import os
+import shutil
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = ".overlay_cache"
+DEFAULT_MEMORY_ITEMS = 256
+DEFAULT_DISK_MB = 500
+
+
+def document_hash(document_bytes: bytes) -> str:
+    """Stable key for a document's contents"""
+    return hashlib.sha256(document_bytes).hexdigest()
+
+
+class OverlayCache:
+    """Two-tier (LRU memory + disk) cache for rendered pages and overlays.
+
+    Values are encoded image bytes, so a hit skips both drawing and re-encoding.
+    Entries evicted from memory stay on disk and are promoted again on access.
+    The disk tier is capped in size and drops its least recently used files
+    first; if it cannot be read or written the cache keeps working from memory.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_items: int = DEFAULT_MEMORY_ITEMS,
+                 max_disk_bytes: Optional[int] = None):
+        # Read settings here rather than at import so values from .env apply
+        self.cache_dir = cache_dir or os.getenv("OVERLAY_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.max_items = max_items
+        if max_disk_bytes is None:
+            max_disk_bytes = int(os.getenv("OVERLAY_CACHE_MAX_MB", DEFAULT_DISK_MB)) * 1024 * 1024
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None  # Computed on first write
+
+    def _disk_path(self, key: Hashable) -> str:
+        name = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, name[:2], name)
+
+    def _disk_files(self):
+        """(mtime, size, path) of every cached file on disk"""
+        files = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _evict_disk(self):
+        """Remove least recently used files until the disk tier is under 90% of its cap"""
+        files = sorted(self._disk_files())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= 0.9 * self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._disk_bytes = total
+
+    def _remember(self, key: Hashable, value: bytes):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                value = f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Overlay cache read failed for {path}: {str(e)}")
+            return None
+        try:
+            # Refresh the access time used for disk eviction
+            os.utime(path)
+        except OSError:
+            pass  # e.g. a read-only cache dir; the hit is still valid
+        self._remember(key, value)
+        return value
+
+    def put(self, key: Hashable, value: bytes):
+        self._remember(key, value)
+        path = self._disk_path(key)
+        # Write then rename so concurrent readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Overlay cache write failed for {path}, keeping it in memory only: {str(e)}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._evict_disk()
+            else:
+                self._disk_bytes += len(value)
+                if self._disk_bytes > self.max_disk_bytes:
+                    self._evict_disk()
+
+    def clear(self):
+        """Drop both the memory and the disk tier"""
+        with self._lock:
+            self._memory.clear()
+            self._disk_bytes = 0
+            try:
+                shutil.rmtree(self.cache_dir)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Overlay cache could not remove {self.cache_dir}: {str(e)}")
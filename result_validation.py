@@ -0,0 +1,198 @@
+import os
+import re
+from typing import Dict, List, Optional
+import pandas as pd
+
+# Fields as returned by the model (see system_instructions.py)
+WEIGHT_FIELDS = ["Net Weight", "Gross Weight"]
+QUANTITY_FIELD = "Quantity"
+DATE_FIELDS = ["Date of Invoice", "Sailing Date"]
+EXPECTED_FIELDS = [
+    "Exporter", "Invoice Number", "Date of Invoice", "For account and risk of", "Notify",
+    "Port of Loading", "Final Destination", "Vessel Name", "Voyage Number", "Sailing Date",
+    "Marks and Numbers", "Description of Goods", "Quantity", "Net Weight", "Gross Weight",
+    "Measurement",
+]
+
+# Conversion factors to kilograms; a missing unit is assumed to be kg
+WEIGHT_UNITS_TO_KG = {
+    "": 1.0,
+    "KG": 1.0,
+    "KGS": 1.0,
+    "KILOS": 1.0,
+    "KILOGRAMS": 1.0,
+    "G": 0.001,
+    "GRAMS": 0.001,
+    "MT": 1000.0,
+    "TON": 1000.0,
+    "TONS": 1000.0,
+    "TONNES": 1000.0,
+    "LB": 0.45359237,
+    "LBS": 0.45359237,
+}
+
+# Common spellings of packing units, so "40 CTNS" and "40 CARTONS" compare equal
+QUANTITY_UNIT_ALIASES = {
+    "CTN": "CTN", "CTNS": "CTN", "CARTON": "CTN", "CARTONS": "CTN",
+    "PC": "PCS", "PCS": "PCS", "PIECE": "PCS", "PIECES": "PCS",
+    "PKG": "PKG", "PKGS": "PKG", "PACKAGE": "PKG", "PACKAGES": "PKG",
+    "BAG": "BAG", "BAGS": "BAG",
+    "BOX": "BOX", "BOXES": "BOX",
+    "PLT": "PLT", "PLTS": "PLT", "PALLET": "PLT", "PALLETS": "PLT",
+}
+
+# Relative difference tolerated between weights/quantities of one shipment
+RELATIVE_TOLERANCE = 0.005
+
+# Trailing document type in file names such as "M.33623INVOICE.pdf"
+DOCUMENT_TYPE_PATTERN = r"[\s_\-]*(INVOICE|PACKING(?:[\s_\-]*LIST)?|BL|B[\s_\-]*L)$"
+NUMBER_PATTERN = r"(?P<number>\d(?:[\d.,]*\d)?)\s*(?P<unit>[A-Za-z]*)"
+# Numbers whose decimal separator is unambiguous. "12.500" (a dot followed by
+# exactly three digits) could be 12.5 or 12500 and matches neither, so it is
+# left unparsed rather than guessed.
+ENGLISH_NUMBER = r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.(?:\d{1,2}|\d{4,}))?"
+EUROPEAN_NUMBER = r"\d{1,3}(?:\.\d{3})+,\d+|\d{1,3}(?:\.\d{3}){2,}|\d+,(?:\d{1,2}|\d{4,})"
+MISSING_VALUES = {"", "-", "N/A", "NA", "NONE", "NULL"}
+
+FLAG_COLUMNS = [
+    "missing_fields",
+    "unparsed_weight",
+    "net_exceeds_gross",
+    "net_weight_mismatch",
+    "gross_weight_mismatch",
+    "quantity_mismatch",
+    "invoice_date_mismatch",
+]
+
+
+def results_to_frame(results: Dict[str, Dict]) -> pd.DataFrame:
+    """Build one row per successfully extracted document from batch results"""
+    # The model sometimes pads keys with whitespace (e.g. "Vessel Name "), so
+    # strip them per row; stripping the frame's columns could create duplicates
+    rows = [
+        {"file_path": fp, **{str(key).strip(): value for key, value in result["response"].items()}}
+        for fp, result in results.items()
+        if result["status"] == "success" and isinstance(result["response"], dict)
+    ]
+    frame = pd.DataFrame(rows, columns=["file_path"] if not rows else None)
+    for field in EXPECTED_FIELDS:
+        if field not in frame.columns:
+            frame[field] = None
+    return frame
+
+
+def _clean_text(series: pd.Series) -> pd.Series:
+    """Cast to stripped strings with placeholder values turned into NA"""
+    text = series.astype("string").str.strip()
+    return text.mask(text.str.upper().isin(MISSING_VALUES))
+
+
+def _parse_numbers(series: pd.Series) -> pd.DataFrame:
+    """Split free text like '1,234.5 KGS' or '1.234,5 KGS' into a float and an upper-case unit"""
+    parts = _clean_text(series).str.extract(NUMBER_PATTERN)
+    text = parts["number"].astype("string")
+    english = text.str.fullmatch(ENGLISH_NUMBER).fillna(False).astype(bool)
+    european = text.str.fullmatch(EUROPEAN_NUMBER).fillna(False).astype(bool)
+    number = pd.to_numeric(text.str.replace(",", "", regex=False).where(english), errors="coerce")
+    number = number.fillna(pd.to_numeric(
+        text.str.replace(".", "", regex=False).str.replace(",", ".", regex=False).where(european),
+        errors="coerce",
+    ))
+    unit = parts["unit"].fillna("").str.upper()
+    return pd.DataFrame({"number": number, "unit": unit}, index=series.index)
+
+
+def shipment_reference(file_paths: pd.Series, invoice_numbers: Optional[pd.Series] = None) -> pd.Series:
+    """Derive the shipment reference from file names ('M.33623INVOICE.pdf' -> 'M.33623').
+
+    Names that are only a document type (e.g. 'a/INVOICE.pdf') fall back to the
+    parent folder, then to the extracted invoice number. Documents left without
+    a reference are NA and take no part in cross-document checks.
+    """
+    stems = file_paths.map(lambda fp: os.path.splitext(os.path.basename(fp))[0])
+    parents = file_paths.map(lambda fp: os.path.basename(os.path.dirname(fp)))
+    reference = stems.str.replace(DOCUMENT_TYPE_PATTERN, "", flags=re.IGNORECASE, regex=True)
+    reference = reference.astype("string").str.strip().str.upper().replace("", pd.NA)
+    reference = reference.fillna(parents.astype("string").str.strip().str.upper().replace("", pd.NA))
+    if invoice_numbers is not None:
+        reference = reference.fillna(_clean_text(invoice_numbers).str.upper())
+    return reference
+
+
+def normalize_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """Add normalized weight (kg), quantity (value and unit) and date columns for the whole batch"""
+    normalized = frame.copy()
+    normalized["shipment_ref"] = shipment_reference(normalized["file_path"], normalized["Invoice Number"])
+    # No expected field has a value, e.g. a response that was not valid JSON
+    normalized["missing_fields"] = ~normalized[EXPECTED_FIELDS].apply(_clean_text).notna().any(axis=1)
+
+    for field in WEIGHT_FIELDS:
+        parsed = _parse_numbers(normalized[field])
+        factor = parsed["unit"].map(WEIGHT_UNITS_TO_KG)
+        column = field.lower().replace(" ", "_")
+        normalized[f"{column}_kg"] = parsed["number"] * factor
+        # Text was present but could not be turned into a known weight
+        normalized[f"{column}_unparsed"] = _clean_text(normalized[field]).notna() & normalized[f"{column}_kg"].isna()
+
+    quantity = _parse_numbers(normalized[QUANTITY_FIELD])
+    normalized["quantity_value"] = quantity["number"]
+    normalized["quantity_unit"] = quantity["unit"].map(QUANTITY_UNIT_ALIASES).fillna(quantity["unit"])
+
+    for field in DATE_FIELDS:
+        column = field.lower().replace(" ", "_")
+        text = _clean_text(normalized[field])
+        # ISO dates first, so dayfirst does not swap their month and day
+        iso = pd.to_datetime(text, errors="coerce", format="ISO8601")
+        other = pd.to_datetime(text.where(iso.isna()), errors="coerce", dayfirst=True, format="mixed")
+        normalized[column] = iso.fillna(other).dt.normalize()
+
+    return normalized
+
+
+def _group_mismatch(normalized: pd.DataFrame, column: str, extra_keys: Optional[List[str]] = None) -> pd.Series:
+    """True where documents of the same shipment disagree on a numeric column"""
+    grouped = normalized.groupby(["shipment_ref"] + (extra_keys or []))[column]
+    high = grouped.transform("max")
+    low = grouped.transform("min")
+    mismatch = ((high - low) > RELATIVE_TOLERANCE * high.abs()).fillna(False).astype(bool)
+    return mismatch & normalized[column].notna() & normalized["shipment_ref"].notna()
+
+
+def flag_inconsistencies(normalized: pd.DataFrame) -> pd.DataFrame:
+    """Add one boolean column per check plus an overall 'flagged' column"""
+    flagged = normalized.copy()
+    flagged["unparsed_weight"] = flagged["net_weight_unparsed"] | flagged["gross_weight_unparsed"]
+    flagged["net_exceeds_gross"] = (flagged["net_weight_kg"] > flagged["gross_weight_kg"]).fillna(False)
+    flagged["net_weight_mismatch"] = _group_mismatch(flagged, "net_weight_kg")
+    flagged["gross_weight_mismatch"] = _group_mismatch(flagged, "gross_weight_kg")
+    # Quantities in different units (e.g. PCS vs CTN) are not comparable
+    flagged["quantity_mismatch"] = _group_mismatch(flagged, "quantity_value", ["quantity_unit"])
+    dates = flagged.groupby("shipment_ref")["date_of_invoice"].transform("nunique")
+    flagged["invoice_date_mismatch"] = ((dates > 1).fillna(False).astype(bool)
+                                        & flagged["date_of_invoice"].notna() & flagged["shipment_ref"].notna())
+    flagged["flagged"] = flagged[FLAG_COLUMNS].any(axis=1)
+    return flagged
+
+
+def validate_results(results: Dict[str, Dict]) -> pd.DataFrame:
+    """Normalize and cross-check a batch of extraction results"""
+    return flag_inconsistencies(normalize_frame(results_to_frame(results)))
+
+
+def flagged_files(validated: pd.DataFrame) -> List[str]:
+    """File paths that failed at least one check and should be re-extracted"""
+    return validated.loc[validated["flagged"], "file_path"].tolist()
+
+
+def validation_summary(validated: pd.DataFrame) -> Dict[str, Dict]:
+    """JSON-serializable validation details keyed by file path"""
+    summary = validated[["file_path", "shipment_ref", "net_weight_kg", "gross_weight_kg",
+                         "quantity_value", "quantity_unit", "date_of_invoice", "sailing_date", "flagged"]].copy()
+    for column in ["date_of_invoice", "sailing_date"]:
+        summary[column] = summary[column].dt.strftime("%Y-%m-%d")
+    summary["flags"] = [
+        [name for name, hit in zip(FLAG_COLUMNS, row) if hit]
+        for row in validated[FLAG_COLUMNS].to_numpy()
+    ]
+    summary = summary.astype(object).where(summary.notna(), None)
+    return summary.set_index("file_path").to_dict(orient="index")
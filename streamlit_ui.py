@@ -89,7 +89,12 @@ def display_results(results):
         with st.expander(f"📄 {os.path.basename(file_path)}", expanded=True):
             if result['status'] == 'success':
                 st.success("✅ Processing successful")
-                
+
+                # Show cross-document validation issues, if any
+                validation = result.get('validation')
+                if validation and validation['flagged']:
+                    st.warning(f"⚠️ Validation flags: {', '.join(validation['flags'])}")
+
                 # Convert JSON to table
                 if isinstance(result['response'], dict):
                     detail_table = []
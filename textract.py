@@ -2,9 +2,12 @@ from PIL import Image, ImageDraw
 import boto3
 import io
 import base64
+import json
 import os
+import numpy as np
 import fitz  # PyMuPDF
 from dotenv import load_dotenv
+from overlay_cache import OverlayCache, document_hash
 
 load_dotenv()
 
@@ -13,27 +16,59 @@ access_key_id = os.getenv("AWS_ACCESS_KEY_ID", "")
 secret_access_key = os.getenv("AWS_SECRET_ACCESS_KEY", "")
 region_name = os.getenv("AWS_REGION", "")
 
+# Textract responses, rendered pages and overlays, keyed by document hash and page
+# (plus DPI and block filter for images)
+overlay_cache = OverlayCache()
+THUMBNAIL_SIZE = (320, 320)
+
+def textract_client():
+    return boto3.client("textract", aws_access_key_id=access_key_id,
+                        aws_secret_access_key=secret_access_key,
+                        region_name=region_name)
+
+def page_count(document_bytes):
+    if not document_bytes.startswith(b"%PDF"):
+        return 1
+    with fitz.open(stream=document_bytes, filetype="pdf") as pdf_document:
+        return len(pdf_document)
+
+def analyze_page(document_bytes, page_num=0, doc_key=None, client=None, pdf_document=None):
+    """Textract response for one page, cached under (document hash, page).
+
+    Textract is only called on a cache miss, so pages that were analyzed
+    before are served without a round trip.
+    """
+    key = ("textract", doc_key or document_hash(document_bytes), page_num)
+    cached = overlay_cache.get(key)
+    if cached is not None:
+        return json.loads(cached)
+
+    client = client or textract_client()
+    image_bytes = render_page(document_bytes, page_num, doc_key=doc_key, pdf_document=pdf_document)
+    if document_bytes.startswith(b"%PDF"):
+        response = client.analyze_document(
+            Document={'Bytes': image_bytes},
+            FeatureTypes=["TABLES", "FORMS"]
+        )
+    else:
+        response = client.detect_document_text(Document={"Bytes": image_bytes})
+    overlay_cache.put(key, json.dumps(response, default=str).encode("utf-8"))
+    return response
+
 def process_document(file_path):
-    client = boto3.client("textract", aws_access_key_id=access_key_id,
-                          aws_secret_access_key=secret_access_key,
-                          region_name=region_name)
+    client = textract_client()
+
+    with open(file_path, 'rb') as document_file:
+        document_bytes = document_file.read()
+    doc_key = document_hash(document_bytes)
 
     if file_path.lower().endswith('.pdf'):
-        with fitz.open(file_path) as pdf_document:
+        # Render through the cache so overlays later reuse these page images
+        with fitz.open(stream=document_bytes, filetype="pdf") as pdf_document:
             for page_num in range(len(pdf_document)):
-                page = pdf_document.load_page(page_num)
-                pix = page.get_pixmap()
-                image_bytes = pix.tobytes("png")
-                response = client.analyze_document(
-                    Document={'Bytes': image_bytes},
-                    FeatureTypes=["TABLES", "FORMS"]
-                )
-                yield response
+                yield analyze_page(document_bytes, page_num, doc_key, client, pdf_document)
     else:
-        with open(file_path, 'rb') as image_file:
-            image_bytes = image_file.read()
-            response = client.detect_document_text(Document={"Bytes": image_bytes})
-            yield response
+        yield analyze_page(document_bytes, 0, doc_key, client)
 
 def extract_raw_text(response):
     raw_text = ""
@@ -42,26 +77,75 @@ def extract_raw_text(response):
             raw_text += item["Text"] + " "
     return raw_text
 
-def visualize_blocks(image_bytes, blocks):
-    image = Image.open(io.BytesIO(image_bytes))
-    draw = ImageDraw.Draw(image)
+def render_page(document_bytes, page_num=0, dpi=72, doc_key=None, pdf_document=None):
+    """Render one page of a PDF (or pass an image through) as PNG bytes, cached.
+
+    Pass an already open pdf_document to avoid reopening it for every page.
+    """
+    if not document_bytes.startswith(b"%PDF"):
+        return document_bytes
+
+    key = ("page", doc_key or document_hash(document_bytes), page_num, dpi)
+    image_bytes = overlay_cache.get(key)
+    if image_bytes is None:
+        if pdf_document is not None:
+            image_bytes = pdf_document.load_page(page_num).get_pixmap(dpi=dpi).tobytes("png")
+        else:
+            with fitz.open(stream=document_bytes, filetype="pdf") as pdf_document:
+                image_bytes = pdf_document.load_page(page_num).get_pixmap(dpi=dpi).tobytes("png")
+        overlay_cache.put(key, image_bytes)
+    return image_bytes
+
+def normalize_block_types(block_types):
+    """Block types as a frozenset (None for all non-PAGE blocks); a bare string is rejected"""
+    if block_types is None:
+        return None
+    if isinstance(block_types, str):
+        raise TypeError(f"block_types must be a collection of block types, not a string: {block_types!r}")
+    return frozenset(block_types) or None
+
+def block_rectangles(blocks, width, height, block_types=None):
+    """Pixel rectangles (x0, y0, x1, y1) for the blocks to draw (all non-PAGE blocks by default).
+
+    Coordinates are left unclamped and unrounded; PIL clips boxes that run off the page.
+    """
+    block_types = normalize_block_types(block_types)
+    bboxes = [
+        (bbox["Left"], bbox["Top"], bbox["Width"], bbox["Height"])
+        for bbox in (
+            block["Geometry"]["BoundingBox"] for block in blocks
+            if (block["BlockType"] in block_types if block_types else block["BlockType"] != "PAGE")
+        )
+    ]
+    if not bboxes:
+        return np.empty((0, 4))
 
-    for block in blocks:
-        if block["BlockType"] != "PAGE":
-            bbox = block["Geometry"]["BoundingBox"]
-            x, y, w, h = bbox["Left"], bbox["Top"], bbox["Width"], bbox["Height"]
-            x *= image.width
-            y *= image.height
-            w *= image.width
-            h *= image.height
-            draw.rectangle([x, y, x + w, y + h], outline="red", width=2)
+    left, top, w, h = np.array(bboxes, dtype=float).T
+    return np.stack([left * width, top * height, (left + w) * width, (top + h) * height], axis=1)
+
+def visualize_blocks(image_bytes, blocks, block_types=None):
+    image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    rectangles = block_rectangles(blocks, image.width, image.height, block_types)
+
+    # Geometry is computed for all blocks at once; PIL still draws each outline
+    draw = ImageDraw.Draw(image)
+    for rectangle in rectangles.tolist():
+        draw.rectangle(rectangle, outline="red", width=2)
 
     return image
 
-def image_to_base64(image):
+def make_thumbnail(image, size=THUMBNAIL_SIZE):
+    thumbnail = image.copy()
+    thumbnail.thumbnail(size)
+    return thumbnail
+
+def image_to_jpeg(image):
     with io.BytesIO() as buffer:
-        image.save(buffer, format="JPEG")
-        return base64.b64encode(buffer.getvalue()).decode("utf-8")
+        image.convert("RGB").save(buffer, format="JPEG")
+        return buffer.getvalue()
+
+def image_to_base64(image):
+    return base64.b64encode(image_to_jpeg(image)).decode("utf-8")
     
 def image_to_data_url(image):
     base64_image = image_to_base64(image)
@@ -69,6 +153,59 @@ def image_to_data_url(image):
 
     return data_url
 
+def jpeg_to_data_url(jpeg_bytes):
+    return f"data:image/jpeg;base64,{base64.b64encode(jpeg_bytes).decode('utf-8')}"
+
+def _overlay_keys(doc_key, page_num, dpi, block_types):
+    block_types = normalize_block_types(block_types)
+    block_filter = tuple(sorted(block_types)) if block_types else None
+    base = ("overlay", doc_key, page_num, dpi, block_filter)
+    return {False: base + (False,), True: base + (True,)}
+
+def _cache_overlays(document_bytes, page_num, blocks, dpi, block_types, doc_key):
+    """Draw a page's overlay once and cache it both full-size and as a thumbnail"""
+    keys = _overlay_keys(doc_key, page_num, dpi, block_types)
+    image = visualize_blocks(render_page(document_bytes, page_num, dpi, doc_key), blocks, block_types)
+    jpegs = {False: image_to_jpeg(image), True: image_to_jpeg(make_thumbnail(image))}
+    for thumbnail, jpeg_bytes in jpegs.items():
+        overlay_cache.put(keys[thumbnail], jpeg_bytes)
+    return jpegs
+
+def overlay_data_url(document_bytes, page_num, blocks=None, dpi=72, block_types=None,
+                     thumbnail=False, doc_key=None):
+    """Data URL of a page with its Textract blocks drawn on it, cached as JPEG.
+
+    Without blocks, a cached overlay is served as is; on a miss the blocks come
+    from the cached Textract response (analyze_page).
+    """
+    doc_key = doc_key or document_hash(document_bytes)
+    jpeg_bytes = overlay_cache.get(_overlay_keys(doc_key, page_num, dpi, block_types)[thumbnail])
+    if jpeg_bytes is None:
+        if blocks is None:
+            blocks = analyze_page(document_bytes, page_num, doc_key)["Blocks"]
+        jpeg_bytes = _cache_overlays(document_bytes, page_num, blocks, dpi, block_types, doc_key)[thumbnail]
+    return jpeg_to_data_url(jpeg_bytes)
+
+def document_overlays(document_bytes, responses=None, dpi=72, block_types=None, thumbnail=True):
+    """Overlay data URLs for every page, warming both full-size and thumbnail overlays
+    so a reviewer can page through the document and open any page without redrawing.
+    Without responses, cached Textract responses are used (analyze_page)."""
+    doc_key = document_hash(document_bytes)
+    pages = range(page_count(document_bytes)) if responses is None else range(len(responses))
+    data_urls = []
+    for page_num in pages:
+        keys = _overlay_keys(doc_key, page_num, dpi, block_types)
+        jpeg_bytes = overlay_cache.get(keys[thumbnail])
+        if jpeg_bytes is None or overlay_cache.get(keys[not thumbnail]) is None:
+            if responses is None:
+                blocks = analyze_page(document_bytes, page_num, doc_key)["Blocks"]
+            else:
+                blocks = responses[page_num]["Blocks"]
+            jpeg_bytes = _cache_overlays(document_bytes, page_num, blocks, dpi,
+                                         block_types, doc_key)[thumbnail]
+        data_urls.append(jpeg_to_data_url(jpeg_bytes))
+    return data_urls
+
 # ...existing code...
 
 def main(file_path):